@@ -0,0 +1,77 @@
+from typing import Any, Dict, Optional
+import argparse
+import json
+import os
+import socket
+import struct
+import sys
+
+# the client only needs the framing, so it starts without importing the validators
+
+# every message is a 4 byte big endian length followed by that many bytes of UTF-8 JSON
+FRAME_HEADER = struct.Struct(">I")
+MAX_FRAME_SIZE = 16 * 1024 * 1024
+
+
+def send_message(sock: socket.socket, message: Dict[str, Any]):
+    data = json.dumps(message).encode("utf-8")
+    sock.sendall(FRAME_HEADER.pack(len(data)) + data)
+
+
+def recv_exactly(sock: socket.socket, size: int) -> Optional[bytes]:
+    buf = bytearray()
+    while len(buf) < size:
+        chunk = sock.recv(size - len(buf))
+        if len(chunk) == 0:
+            return None
+        buf += chunk
+    return bytes(buf)
+
+
+def recv_message(sock: socket.socket) -> Optional[Dict[str, Any]]:
+    """
+    receives one framed message
+    :param sock:
+    :return: the decoded message, None if the connection was closed
+    """
+    header = recv_exactly(sock, FRAME_HEADER.size)
+    if header is None:
+        return None
+    (size,) = FRAME_HEADER.unpack(header)
+    if size > MAX_FRAME_SIZE:
+        raise ValueError(f"Message too large ({size} bytes)")
+    data = recv_exactly(sock, size)
+    if data is None:
+        return None
+    return json.loads(data)
+
+
+def check_remote(socket_path: str, config_path: str, schema_path: str) -> Optional[str]:
+    """
+    Validates a config file using a running server.
+    :param socket_path: unix socket the server listens on
+    :param config_path: config file to check, relative paths are resolved in the current directory
+    :param schema_path: schema file to use, relative paths are resolved in the current directory
+    :return: None if the config is valid, otherwise the error message
+    """
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.connect(socket_path)
+        send_message(sock, {"config": os.path.abspath(config_path), "schema": os.path.abspath(schema_path)})
+        response = recv_message(sock)
+
+    if response is None:
+        return "Server closed the connection"
+    return response.get("error", None)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="validates a config file using a running check_config server")
+    parser.add_argument("file", help="config file to check")
+    parser.add_argument("-s", "--schema", required=True, help="schema file to use")
+    parser.add_argument("--socket", metavar="SOCKET", required=True, help="unix socket the server listens on")
+    args = parser.parse_args()
+
+    error = check_remote(args.socket, args.file, args.schema)
+    if error is not None:
+        print(error, file=sys.stderr)
+        sys.exit(1)
@@ -1,54 +1,140 @@
-import json
-import tomllib
+from typing import TYPE_CHECKING, Any, Dict, Optional, Tuple
 import argparse
+import os
+import socketserver
+import stat
+import sys
+import threading
 
-from validators import Validator
-from generic_schema.parse_validator import parse_validator
+# the client parts are re-exported, they live in check_client so that clients start without the validators
+from generic_schema.check_client import FRAME_HEADER, MAX_FRAME_SIZE, check_remote, recv_message, send_message
+from generic_schema.config_file import load_file
 
-import pdb
+if TYPE_CHECKING:
+    from generic_schema.parse_validator import CompiledSchema
 
 
-def load_schema(schema: dict, path: str = "") -> dict:
-    ret = {}
-    if len(path) > 0:
-        path += "."
+def compile_schema(path: str) -> "CompiledSchema":
+    """
+    loads and compiles a schema file, the validators are only imported when a schema is needed
+    :param path:
+    :return:
+    """
+    from generic_schema.parse_validator import CompiledSchema
+    return CompiledSchema(load_file(path))
 
-    for k, v in schema.items():
-        if isinstance(v, dict):
-            if v.get("_type", None) is not None:
-                ret[k] = parse_validator(path + k, v)
+
+class SchemaCache():
+    """
+    Keeps compiled schemas in memory and reloads them when the schema file changes.
+    """
+
+    def __init__(self):
+        self.schemas: Dict[str, Tuple[Tuple[int, int], "CompiledSchema"]] = {}
+        self.lock = threading.Lock()
+
+    def get(self, path: str) -> "CompiledSchema":
+        path = os.path.abspath(path)
+        st = os.stat(path)
+        stamp = (st.st_mtime_ns, st.st_size)
+
+        cached = self.schemas.get(path, None)
+        if cached is not None and cached[0] == stamp:
+            return cached[1]
+
+        schema = compile_schema(path)
+        with self.lock:
+            self.schemas[path] = (stamp, schema)
+        return schema
+
+
+def check_file(config_path: str, schema_path: str, cache: Optional[SchemaCache] = None) -> Optional[str]:
+    """
+    Validates a config file against a schema file.
+    :param config_path: config file to check (JSON or TOML)
+    :param schema_path: schema file to use (JSON or TOML)
+    :param cache: cache for compiled schemas, the schema is loaded again if not given
+    :return: None if the config is valid, otherwise the error message
+    """
+    try:
+        schema = cache.get(schema_path) if cache is not None else compile_schema(schema_path)
+    except (OSError, ValueError, TypeError, KeyError, AttributeError) as e:
+        return f"Invalid schema {schema_path}: {e!r}"
+
+    try:
+        schema.validate(load_file(config_path), inplace=True)
+    except (OSError, ValueError) as e:
+        return f"{config_path}: {e}"
+    except (TypeError, KeyError, AttributeError) as e:
+        # checks with values of the wrong type (e.g. min = "x") only fail when they are used
+        return f"Invalid schema {schema_path}: {e!r}"
+
+    return None
+
+
+class CheckHandler(socketserver.BaseRequestHandler):
+    def handle(self):
+        # a client may send any number of requests over one connection
+        while True:
+            try:
+                request = recv_message(self.request)
+            except ValueError as e:
+                send_message(self.request, {"ok": False, "error": f"Invalid request: {e}"})
+                return
+            if request is None:
+                return
+
+            if not isinstance(request, dict) or "config" not in request or "schema" not in request:
+                error = "Invalid request: config and schema are required"
+            elif not isinstance(request["config"], str) or not isinstance(request["schema"], str):
+                # open() would take integers as file descriptors of the server
+                error = "Invalid request: config and schema must be paths"
             else:
-                ret[k] = load_schema(v, path + k)
-        elif isinstance(v, str):
-            ret[k] = parse_validator(path + k, v)
-        else:
-            raise TypeError(f"Unsupported type in schema {type(v)}")
+                try:
+                    error = check_file(request["config"], request["schema"], self.server.cache)
+                except Exception as e:
+                    # the client always gets an answer, whatever went wrong
+                    error = f"Internal error: {e!r}"
+            send_message(self.request, {"ok": error is None, "error": error})
 
-    return ret
 
+class CheckServer(socketserver.ThreadingUnixStreamServer):
+    daemon_threads = True
 
-def check_schema(config: dict, schema: dict, schema_data: dict):
-    for k, v in schema:
-        if isinstance(v, Validator):
-            v.validate(config[k], schema_data[k])
-        elif isinstance(v, dict):
-            if config is None:
-                config = {}
-            check_schema(config.get(k, None), v, schema_data[k])
+    def __init__(self, socket_path: str):
+        self.cache = SchemaCache()
+        # remove a stale socket of a previous server, but never a regular file
+        if os.path.exists(socket_path) and stat.S_ISSOCK(os.stat(socket_path).st_mode):
+            os.unlink(socket_path)
+        super().__init__(socket_path, CheckHandler)
 
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser()
-    parser.add_argument("file", help="config file to check")
+    parser.add_argument("file", nargs="?", help="config file to check")
     parser.add_argument("-s", "--schema", help="schema file to use")
+    parser.add_argument("--serve", metavar="SOCKET", help="run a validation server on the given unix socket")
+    parser.add_argument("--socket", metavar="SOCKET", help="validate using the server on the given unix socket")
     args = parser.parse_args()
 
-    configfile = open(args.file, "r")
-    config_data = json.load(configfile)
+    if args.serve is not None:
+        with CheckServer(args.serve) as server:
+            try:
+                server.serve_forever()
+            except KeyboardInterrupt:
+                pass
+            finally:
+                os.unlink(args.serve)
+        sys.exit(0)
+
+    if args.file is None or args.schema is None:
+        parser.error("file and --schema are required")
 
-    with open(args.schema, "rb") as f:
-        schema_data = tomllib.load(f)
-        schema = load_schema(schema_data)
+    if args.socket is not None:
+        error = check_remote(args.socket, args.file, args.schema)
+    else:
+        error = check_file(args.file, args.schema)
 
-    check_schema(config_data, schema, schema_data)
-    pdb.set_trace()
\ No newline at end of file
+    if error is not None:
+        print(error, file=sys.stderr)
+        sys.exit(1)
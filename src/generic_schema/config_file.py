@@ -0,0 +1,25 @@
+from typing import Any, Dict
+import json
+import tomllib
+
+
+def parse_config(path: str, source: bytes) -> Dict[str, Any]:
+    """
+    parses a TOML or JSON config depending on the file extension
+    :param path: path of the config file
+    :param source: contents of the config file
+    :return:
+    """
+    if path.endswith(".toml"):
+        return tomllib.loads(source.decode("utf-8"))
+    return json.loads(source)
+
+
+def load_file(path: str) -> Dict[str, Any]:
+    """
+    loads a TOML or JSON file depending on the file extension
+    :param path:
+    :return:
+    """
+    with open(path, "rb") as f:
+        return parse_config(path, f.read())
@@ -0,0 +1,288 @@
+from typing import Any, Dict, Iterable, Iterator, List, Optional, TextIO, Tuple
+import argparse
+import functools
+import json
+import math
+import os
+import random
+import string
+import sys
+
+from generic_schema.extra_validators import VersionValidator, URIValidator
+from generic_schema.parse_validator import CompiledSchema
+from generic_schema.sorted_table import SortedTable
+from generic_schema.validators import Validator, BooleanValidator, NumberValidator, StringValidator, \
+    RegExValidator, EMailValidator, FileValidator, DirectoryValidator, EnumValidator, ArrayValidator
+
+MUTATIONS = ("type", "range", "missing")
+
+# range used for numbers without any bounds
+FLOAT_RANGE = 1e6
+# extra items/characters generated above the minimum when no maximum is given
+DEFAULT_SPREAD = 8
+
+# paths that exist on every installation, used for file and directory fields
+EXISTING_FILE = os.path.abspath(__file__)
+EXISTING_DIRECTORY = os.path.dirname(EXISTING_FILE)
+
+
+def _word(rng: random.Random, length: int) -> str:
+    return "".join(rng.choices(string.ascii_lowercase, k=length))
+
+
+@functools.lru_cache(maxsize=64)
+def _values_tuple(values: frozenset) -> tuple:
+    # sorted so that a seed always produces the same values
+    return tuple(sorted(values, key=repr))
+
+
+def number_bounds(validator: NumberValidator, check: Dict[str, Any]) -> Tuple[Optional[Any], Optional[Any]]:
+    """
+    returns the effective minimum and maximum like NumberValidator.validate
+    :param validator:
+    :param check: Dictionary item loaded from the toml file
+    :return:
+    """
+    minimum = check.get("min", validator.min)
+    if validator.min is not None:
+        minimum = max(validator.min, minimum)
+    maximum = check.get("max", validator.max)
+    if validator.max is not None:
+        maximum = min(validator.max, maximum)
+    return minimum, maximum
+
+
+def length_bounds(check: Dict[str, Any], minkey: str, maxkey: str) -> Tuple[int, int]:
+    minimum = check.get(minkey, 0)
+    return minimum, check.get(maxkey, minimum + DEFAULT_SPREAD)
+
+
+def generate_value(validator: Validator, check: Dict[str, Any], rng: random.Random) -> Any:
+    """
+    Generates a random value the validator accepts.
+    :param validator: validator created by parse_validator
+    :param check: Dictionary item loaded from the toml file
+    :param rng: random number generator to use
+    :return:
+    """
+    if isinstance(validator, BooleanValidator):
+        return rng.random() < 0.5
+    elif isinstance(validator, NumberValidator):
+        minimum, maximum = number_bounds(validator, check)
+        if validator.min is not None:
+            # all integer types have bounds, floats do not
+            return rng.randint(math.ceil(minimum), math.floor(maximum))
+        # a missing bound is derived from the given one, so that the range is never empty
+        if minimum is None:
+            minimum = (min(maximum, 0) if maximum is not None else 0) - FLOAT_RANGE
+        if maximum is None:
+            maximum = max(minimum, 0) + FLOAT_RANGE
+        return rng.uniform(minimum, maximum)
+    elif isinstance(validator, VersionValidator):
+        return f"{rng.randint(0, 20)}.{rng.randint(0, 99)}.{rng.randint(0, 999)}"
+    elif isinstance(validator, URIValidator):
+        return f"https://{_word(rng, 8)}.example.com/{_word(rng, 6)}"
+    elif isinstance(validator, RegExValidator):
+        if "default" in check.keys():
+            return check["default"]
+        raise TypeError(f"Cannot generate values for regex field {validator.name} without a default")
+    elif isinstance(validator, StringValidator):
+        minimum, maximum = length_bounds(check, "min", "max")
+        return _word(rng, rng.randint(minimum, maximum))
+    elif isinstance(validator, EMailValidator):
+        return f"{_word(rng, 8)}@{_word(rng, 6)}.com"
+    elif isinstance(validator, FileValidator):
+        if check.get("exists", True) or check.get("isfile", True):
+            return EXISTING_FILE
+        return os.path.join(EXISTING_DIRECTORY, _word(rng, 8))
+    elif isinstance(validator, DirectoryValidator):
+        if check.get("exists", True) or check.get("isdir", True):
+            return EXISTING_DIRECTORY
+        return os.path.join(EXISTING_DIRECTORY, _word(rng, 8))
+    elif isinstance(validator, EnumValidator):
+        allowed = validator.allowed(check)
+        if isinstance(allowed, SortedTable):
+            if allowed.size == 0:
+                raise TypeError(f"Cannot generate values for enum field {validator.name} without values")
+            return allowed.value_at(rng.randrange(allowed.size))
+        if len(allowed) == 0:
+            raise TypeError(f"Cannot generate values for enum field {validator.name} without values")
+        return rng.choice(_values_tuple(allowed))
+    elif isinstance(validator, ArrayValidator):
+        minimum, maximum = length_bounds(check, "minlen", "maxlen")
+        return [generate_value(validator.subtype, validator.subtype_check, rng)
+                for _ in range(rng.randint(minimum, maximum))]
+
+    raise TypeError(f"Cannot generate values for field {validator.name}")
+
+
+def generate_config(schema: CompiledSchema, rng: random.Random, omit_defaults: float = 0.1) -> Dict[str, Any]:
+    """
+    Generates a random configuration that is valid for the schema.
+    :param schema:
+    :param rng: random number generator to use
+    :param omit_defaults: probability to leave out keys that have a default value
+    :return:
+    """
+    ret = {}
+    for key, validator, check in schema.entries:
+        if isinstance(validator, CompiledSchema):
+            ret[key] = generate_config(validator, rng, omit_defaults)
+        elif "default" not in check.keys() or rng.random() >= omit_defaults:
+            ret[key] = generate_value(validator, check, rng)
+    # entries are sorted by validation cost, keep the keys in schema order
+    return {key: ret[key] for key in schema.schema.keys() if key in ret}
+
+
+def _leaves(config: Dict[str, Any], schema: CompiledSchema, ret: List):
+    for key, validator, check in schema.entries:
+        if isinstance(validator, CompiledSchema):
+            _leaves(config[key], validator, ret)
+        elif key in config.keys():
+            ret.append((config, key, validator, check))
+    return ret
+
+
+def _wrong_type(value: Any, rng: random.Random) -> Any:
+    candidates = [v for v in ["invalid", 123456789, 1.5, True, [1], {"invalid": 1}]
+                  if type(v) is not type(value)]
+    return rng.choice(candidates)
+
+
+def _out_of_range(value: Any, validator: Validator, check: Dict[str, Any], rng: random.Random) -> Any:
+    # returns value itself if there is no range to violate
+    if isinstance(validator, NumberValidator):
+        minimum, maximum = number_bounds(validator, check)
+        candidates = [b for b in [minimum - 1 if minimum is not None else None,
+                                  maximum + 1 if maximum is not None else None] if b is not None]
+        return rng.choice(candidates) if len(candidates) > 0 else value
+    elif isinstance(validator, ArrayValidator):
+        minimum, maximum = length_bounds(check, "minlen", "maxlen")
+        if "maxlen" in check.keys():
+            return value + [generate_value(validator.subtype, validator.subtype_check, rng)
+                            for _ in range(maximum + 1 - len(value))]
+        if minimum > 0:
+            return value[:minimum - 1]
+        return value
+    elif isinstance(validator, (EnumValidator, EMailValidator, RegExValidator)):
+        return "\x00invalid"
+    elif isinstance(validator, StringValidator):
+        if "max" in check.keys():
+            return "x" * (check["max"] + 1)
+        if check.get("min", 0) > 0:
+            return value[:check["min"] - 1]
+        return value
+    elif isinstance(validator, (FileValidator, DirectoryValidator)):
+        return os.path.join(EXISTING_DIRECTORY, "\x00invalid")
+    return value
+
+
+def mutate_config(config: Dict[str, Any], schema: CompiledSchema, rng: random.Random,
+                  mutations: Iterable[str] = MUTATIONS, attempts: int = 16) -> Dict[str, Any]:
+    """
+    Changes a valid configuration so that it fails validation.
+    :param config: valid configuration, it is modified
+    :param schema:
+    :param rng: random number generator to use
+    :param mutations: kinds of mutations to choose from: "type" (wrong type), "range" (value, length or item count
+                      outside of the bounds), "missing" (remove a key without default)
+    :param attempts: number of mutations tried before giving up
+    :return: config
+    """
+    mutations = tuple(mutations)
+    leaves = _leaves(config, schema, [])
+    for _ in range(attempts):
+        if len(leaves) == 0:
+            break
+        parent, key, validator, check = rng.choice(leaves)
+        mutation = rng.choice(mutations)
+        original = parent[key]
+
+        if mutation == "missing":
+            if "default" in check.keys():
+                continue
+            del parent[key]
+        elif mutation == "range":
+            parent[key] = _out_of_range(original, validator, check, rng)
+        elif mutation == "type":
+            parent[key] = _wrong_type(original, rng)
+        else:
+            raise ValueError(f"Unknown mutation {mutation}")
+
+        try:
+            schema.validate(config)
+        except ValueError:
+            return config
+        parent[key] = original
+
+    raise ValueError("Could not find a mutation that makes the config invalid")
+
+
+def generate_configs(schema: Dict[str, Any], count: int, seed: Optional[int] = None,
+                     invalid: bool = False, mutations: Iterable[str] = MUTATIONS) -> Iterator[Dict[str, Any]]:
+    """
+    Generates random configurations for a schema.
+    :param schema: Dictionary containing the schema
+    :param count: number of configurations
+    :param seed: seed for reproducible output
+    :param invalid: if True, every configuration is mutated to fail validation
+    :param mutations: kinds of mutations for invalid configurations, see mutate_config
+    :return:
+    """
+    compiled = CompiledSchema(schema)
+    rng = random.Random(seed)
+    for _ in range(count):
+        config = generate_config(compiled, rng)
+        if invalid:
+            config = mutate_config(config, compiled, rng, mutations)
+        yield config
+
+
+def write_ndjson(fp: TextIO, configs: Iterable[Dict[str, Any]], batch: int = 1024):
+    """
+    Writes configurations as newline delimited JSON.
+    :param fp: text file to write to
+    :param configs:
+    :param batch: number of lines collected per write call
+    :return:
+    """
+    encode = json.JSONEncoder(separators=(",", ":"), ensure_ascii=False).encode
+    lines = []
+    for config in configs:
+        lines.append(encode(config))
+        if len(lines) >= batch:
+            lines.append("")
+            fp.write("\n".join(lines))
+            lines = []
+    if len(lines) > 0:
+        lines.append("")
+        fp.write("\n".join(lines))
+
+
+if __name__ == "__main__":
+    from generic_schema.config_file import load_file
+
+    parser = argparse.ArgumentParser(description="generates random configs for a schema as NDJSON")
+    parser.add_argument("schema", help="schema file to use")
+    parser.add_argument("-n", "--count", type=int, default=1, help="number of valid configs")
+    parser.add_argument("-o", "--output", help="file for valid configs, defaults to stdout")
+    parser.add_argument("--invalid", type=int, default=0, help="number of invalid configs")
+    parser.add_argument("--invalid-output", help="file for invalid configs")
+    parser.add_argument("--mutations", default=",".join(MUTATIONS), help="comma separated mutations for invalid configs")
+    parser.add_argument("--seed", type=int, help="seed for reproducible output")
+    args = parser.parse_args()
+
+    if args.invalid > 0 and args.invalid_output is None:
+        parser.error("--invalid requires --invalid-output")
+
+    schema_data = load_file(args.schema)
+
+    out = open(args.output, "w", encoding="utf-8") if args.output is not None else sys.stdout
+    with out:
+        write_ndjson(out, generate_configs(schema_data, args.count, seed=args.seed))
+
+    if args.invalid > 0:
+        seed = args.seed + 1 if args.seed is not None else None
+        with open(args.invalid_output, "w", encoding="utf-8") as out:
+            write_ndjson(out, generate_configs(schema_data, args.invalid, seed=seed, invalid=True,
+                                               mutations=args.mutations.split(",")))
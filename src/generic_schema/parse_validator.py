@@ -1,9 +1,11 @@
-from typing import Any, Dict
+from typing import Any, Dict, List, Optional
+import threading
 
 from generic_schema.extra_validators import VersionValidator, URIValidator
 from generic_schema.validators import Validator, FloatValidator, DoubleValidator, StringValidator, Int8Validator, \
     Int16Validator, Int32Validator, Int64Validator, UInt8Validator, UInt16Validator, UInt32Validator, UInt64Validator, \
-    BooleanValidator, EMailValidator, RegExValidator, FileValidator, DirectoryValidator, ArrayValidator
+    BooleanValidator, EMailValidator, RegExValidator, FileValidator, DirectoryValidator, ArrayValidator, \
+    EnumValidator, Budget, BudgetExceededError
 
 
 def parse_validator(name: str, check: Any) -> Validator:
@@ -56,48 +58,189 @@ def parse_validator(name: str, check: Any) -> Validator:
         return DirectoryValidator(name)
     elif typename in ["uri"]:
         return URIValidator(name)
+    elif typename in ["enum", "oneof"]:
+        if isinstance(check, dict):
+            return EnumValidator(name=name, values=check.get("values", None), values_file=check.get("values_file", None))
+        return EnumValidator(name)
     elif typename in ["array", "arr"]:
+        if not isinstance(check, dict) or "subtype" not in check.keys():
+            raise TypeError(f"Missing subtype for array field {name}")
         return ArrayValidator(name=name, subtype=parse_validator(name=f"{name}_arrayitem", check=check["subtype"]), subtype_check=check["subtype"] if isinstance(check["subtype"], dict) else {})
     else:
         raise TypeError(f"Invalid/Unknown typename {typename} for field {name}")
 
 
-def validate_type(value: Any, check: Any) -> Any:
+def validate_type(value: Any, check: Any, full_check: bool = False,
+                  coverage: Optional[Dict[str, List[int]]] = None, budget: Optional[Budget] = None) -> Any:
     """
     Validates a single value against a check.
     :param value:
     :param check: Dictionary item loaded from the toml file, may be dictionary or string
+    :param full_check: if True, arrays validate all items even if their check enables sampling
+    :param coverage: if given, [validated items, total items] is added up for every array by name
+    :param budget: limits for time, nesting and sizes, raises BudgetExceededError when exceeded
     :return:
     """
     validator = parse_validator(name="value", check=check)
-    return validator.validate(value=value, check=check)
+    if isinstance(validator, ArrayValidator):
+        return validator.validate(value=value, check=check, full_check=full_check, coverage=coverage, budget=budget)
+    if budget is not None:
+        budget.check(validator.name, value)
+    return validator.validate(value=value, check=check if isinstance(check, dict) else {})
 
 
-def validate_config(config: Dict[str, Any], schema: Dict[str, Any]) -> Dict[str, Any]:
+class CompiledSchema():
     """
-    Validates a configuration against a schema and returns the configuration.
-    :param config: Dictionary containing the configuration
-    :param schema: Dictionary containing the schema
-    :return:
+    A schema with the validators for all fields already created, so it can be used for many configurations.
+
+    Fields are validated ordered by the estimated cost of their validator, so cheap type and range checks run
+    before regular expressions and filesystem checks. With adaptive, fields that fail often are moved to the front,
+    so rejected configurations fail as early as possible.
     """
-    ret = {}
-    for key, check in schema.items():
-        if key not in config.keys():
-            raise ValueError(f"Missing key {key} in config file")
-
-        if isinstance(config[key], dict):
-            try:
-                ret[key] = validate_config(config[key], check)
-                continue
-            except ValueError as e:
-                raise ValueError(f"Error in subfield of {key}: {e}") from e
 
+    def __init__(self, schema: Dict[str, Any], path: str = "", adaptive: bool = False):
+        self.schema = schema
+        self.path = path
+        self.adaptive = adaptive
+        # number of failed validations per key, only counted with adaptive
+        self.failures: Dict[str, int] = {}
+        # serializes record_failure, validations sharing the schema across threads fail concurrently
+        self.lock = threading.Lock()
+        # list of (key, validator or nested CompiledSchema, check dictionary)
+        entries = []
+        for key, check in schema.items():
+            name = f"{path}.{key}" if len(path) > 0 else key
+            if isinstance(check, dict) and check.get("_type", None) is None:
+                entries.append((key, CompiledSchema(check, name, adaptive), check))
+            else:
+                entries.append((key, parse_validator(name, check), check if isinstance(check, dict) else {}))
+        self.cost = sum(validator.cost for _, validator, _ in entries)
+        # sorted is stable, fields of the same cost keep the schema order
+        self.entries = sorted(entries, key=lambda entry: entry[1].cost)
+
+    def record_failure(self, key: str):
+        """
+        counts a failure of the entry for key and moves it in front of all entries that failed less often
+        :param key:
+        :return:
+        """
+        with self.lock:
+            failures = self.failures
+            failures[key] = failures.get(key, 0) + 1
+
+            # work on the current order, other threads may have reordered since the failing validation started
+            entries = self.entries
+            index = next(i for i, entry in enumerate(entries) if entry[0] == key)
+            target = index
+            while target > 0 and failures.get(entries[target - 1][0], 0) < failures[key]:
+                target -= 1
+            if target != index:
+                # validations running without the lock keep iterating over the list they started with, so it is
+                # replaced instead of modified
+                reordered = list(entries)
+                reordered.insert(target, reordered.pop(index))
+                self.entries = reordered
+
+    def validate(self, config: Dict[str, Any], inplace: bool = False, full_check: bool = False,
+                 coverage: Optional[Dict[str, List[int]]] = None, budget: Optional[Budget] = None,
+                 pending: Optional[List] = None) -> Dict[str, Any]:
+        """
+        Validates a configuration, see validate_config.
+        :param config: Dictionary containing the configuration
+        :param inplace: if True, config is not copied
+        :param full_check: if True, arrays validate all items even if their check enables sampling
+        :param coverage: if given, [validated items, total items] is added up for every array by name
+        :param budget: limits for time, nesting and sizes, raises BudgetExceededError when exceeded
+        :param pending: used for nested tables in place, collects the (table, key, value) writes of the whole config
+        :return:
+        """
+        if not isinstance(config, dict):
+            raise ValueError(f"{self.path or 'config'} must be a table, not {type(config).__name__}")
+
+        # keys are created in schema order, independent of the validation order
+        ret = config if inplace else dict.fromkeys(self.schema.keys())
+        # in place, defaults are only written once the whole config is valid, so a failed validation leaves
+        # the config untouched
+        writes = pending if pending is not None else []
+        entries = self.entries
+        index = 0
+        if budget is not None:
+            budget.enter(self.path or "config")
         try:
-            ret[key] = validate_type(value=config[key], check=check)
+            for index, (key, validator, check) in enumerate(entries):
+                if key not in config.keys():
+                    if "default" not in check.keys() or isinstance(validator, CompiledSchema):
+                        raise ValueError(f"Missing key {key} in config file")
+                    if inplace:
+                        writes.append((config, key, check["default"]))
+                    else:
+                        ret[key] = check["default"]
+                    continue
+
+                value = config[key]
+                if budget is not None:
+                    # before the validator runs, so no regex sees an oversized string
+                    budget.check(validator.path if isinstance(validator, CompiledSchema) else validator.name, value)
+
+                if isinstance(validator, CompiledSchema):
+                    if not isinstance(value, dict):
+                        raise ValueError(f"Error in field {key}: {value} is not a table")
+                    try:
+                        value = validator.validate(value, inplace=inplace, full_check=full_check, coverage=coverage,
+                                                   budget=budget, pending=writes)
+                    except BudgetExceededError:
+                        raise
+                    except ValueError as e:
+                        raise ValueError(f"Error in subfield of {key}: {e}") from e
+                else:
+                    try:
+                        if isinstance(validator, ArrayValidator):
+                            value = validator.validate(value, check, full_check=full_check, coverage=coverage,
+                                                       budget=budget)
+                        else:
+                            value = validator.validate(value, check)
+                    except BudgetExceededError:
+                        raise
+                    except ValueError as e:
+                        raise ValueError(f"Error in field {key}: {e}") from e
+
+                if not inplace:
+                    ret[key] = value
+                elif value is not config[key]:
+                    # in place only changed values (filled defaults) are written back
+                    writes.append((config, key, value))
         except ValueError as e:
-            raise ValueError(f"Error in field {key}: {e}") from e
+            # running out of budget is not the fault of the field
+            if self.adaptive and not isinstance(e, BudgetExceededError):
+                self.record_failure(entries[index][0])
+            raise
+        finally:
+            if budget is not None:
+                budget.leave()
+
+        if inplace and pending is None:
+            for table, key, value in writes:
+                table[key] = value
+
+        return ret
 
-    return ret
+
+def validate_config(config: Dict[str, Any], schema: Dict[str, Any], inplace: bool = False, full_check: bool = False,
+                    coverage: Optional[Dict[str, List[int]]] = None, budget: Optional[Budget] = None) -> Dict[str, Any]:
+    """
+    Validates a configuration against a schema and returns the configuration.
+    Missing keys are filled with their default value, if the schema has one.
+    :param config: Dictionary containing the configuration
+    :param schema: Dictionary containing the schema
+    :param inplace: if True, config is not copied. Defaults are inserted into config and config itself is returned.
+                    Defaults are only inserted if the whole config is valid.
+    :param full_check: if True, arrays validate all items even if their check enables sampling
+    :param coverage: if given, [validated items, total items] is added up for every array by name
+    :param budget: limits for time, nesting and sizes, raises BudgetExceededError when exceeded
+    :return:
+    """
+    return CompiledSchema(schema).validate(config, inplace=inplace, full_check=full_check, coverage=coverage,
+                                           budget=budget)
 
 
 def validate_config_key(key: str, value: Any, schema: Dict[str, Any]) -> Any:
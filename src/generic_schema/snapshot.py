@@ -0,0 +1,152 @@
+from typing import Any, Dict, List, Optional
+import hashlib
+import importlib.metadata
+import json
+import marshal
+import mmap
+import os
+import sys
+import tempfile
+
+from generic_schema.config_file import parse_config
+from generic_schema.parse_validator import validate_config
+
+# magic and format version, environment hash, schema hash, source hash (all sha256), then the marshalled config
+MAGIC = b"GSSNAP\x00\x02"
+HEADER_SIZE = len(MAGIC) + 3 * hashlib.sha256().digest_size
+
+# part of the environment hash, increase it whenever a change of the validators (or of what a snapshot stores)
+# changes validation results, the package version is "unknown" when running from a source tree
+SNAPSHOT_VERSION = 1
+
+
+def package_version() -> str:
+    try:
+        return importlib.metadata.version("generic_schema")
+    except importlib.metadata.PackageNotFoundError:
+        return "unknown"
+
+
+def environment_hash() -> bytes:
+    """
+    returns a hash of the Python version, the marshal format version, SNAPSHOT_VERSION and the package version,
+    snapshots written by another environment are not used
+    :return:
+    """
+    stamp = f"{sys.version_info[0]}.{sys.version_info[1]} {marshal.version} {SNAPSHOT_VERSION} {package_version()}"
+    return hashlib.sha256(stamp.encode("utf-8")).digest()
+
+
+def _values_file_stamps(schema: Any, ret: List):
+    if isinstance(schema, dict):
+        if isinstance(schema.get("values_file", None), str):
+            path = os.path.abspath(schema["values_file"])
+            try:
+                st = os.stat(path)
+                ret.append([path, st.st_mtime_ns, st.st_size])
+            except OSError:
+                ret.append([path, None, None])
+        for v in schema.values():
+            _values_file_stamps(v, ret)
+    return ret
+
+
+def schema_hash(schema: Dict[str, Any]) -> bytes:
+    """
+    returns a hash of the schema that does not depend on key order. It includes the modification time and size
+    of every values_file the schema references, since changing those changes the validation result.
+    :param schema: Dictionary containing the schema
+    :return:
+    """
+    data = json.dumps([schema, _values_file_stamps(schema, [])], sort_keys=True, default=str)
+    return hashlib.sha256(data.encode("utf-8")).digest()
+
+
+def source_hash(source: bytes) -> bytes:
+    """
+    returns the hash of the raw config file contents
+    :param source: contents of the config file
+    :return:
+    """
+    return hashlib.sha256(source).digest()
+
+
+def write_snapshot(path: str, config: Dict[str, Any], schema: Dict[str, Any], source: bytes):
+    """
+    Writes a validated configuration to a snapshot file. The file is replaced atomically, so concurrent
+    readers either see the old or the new snapshot.
+    :param path: snapshot file to write
+    :param config: Dictionary returned by validate_config
+    :param schema: Dictionary containing the schema the config was validated against
+    :param source: contents of the config file the config was loaded from
+    :raises ValueError: if the config contains values that cannot be stored (only builtin types are supported)
+    :return:
+    """
+    data = MAGIC + environment_hash() + schema_hash(schema) + source_hash(source) + marshal.dumps(config)
+
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)), prefix=".snapshot-")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+
+
+def read_snapshot(path: str, schema: Dict[str, Any], source: bytes) -> Optional[Dict[str, Any]]:
+    """
+    Reads a snapshot written by write_snapshot.
+    :param path: snapshot file to read
+    :param schema: Dictionary containing the schema
+    :param source: contents of the config file
+    :return: the validated configuration, or None if the snapshot is missing, invalid or stale
+    """
+    try:
+        f = open(path, "rb")
+    except FileNotFoundError:
+        return None
+
+    with f:
+        if os.fstat(f.fileno()).st_size < HEADER_SIZE:
+            return None
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            if mm[:HEADER_SIZE] != MAGIC + environment_hash() + schema_hash(schema) + source_hash(source):
+                return None
+            # unmarshal straight from the mapping without copying the payload first, the config itself is still
+            # built on the heap
+            with memoryview(mm) as view, view[HEADER_SIZE:] as payload:
+                try:
+                    config = marshal.loads(payload)
+                except (EOFError, ValueError, TypeError):
+                    return None
+    # a corrupted payload may still unmarshal to something else
+    return config if isinstance(config, dict) else None
+
+
+def load_config(path: str, schema: Dict[str, Any], snapshot_path: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Loads and validates a config file. If a snapshot for the same schema and config contents exists, it is loaded
+    instead and parsing and validation are skipped, otherwise a new snapshot is written after validation.
+    :param path: path of the config file (JSON or TOML)
+    :param schema: Dictionary containing the schema
+    :param snapshot_path: path of the snapshot file, defaults to the config path with ".snapshot" appended
+    :return:
+    """
+    if snapshot_path is None:
+        snapshot_path = path + ".snapshot"
+
+    with open(path, "rb") as f:
+        source = f.read()
+
+    config = read_snapshot(snapshot_path, schema, source)
+    if config is not None:
+        return config
+
+    config = validate_config(parse_config(path, source), schema)
+    try:
+        write_snapshot(snapshot_path, config, schema, source)
+    except (ValueError, OSError):
+        # values marshal cannot store (e.g. TOML dates) or a read-only directory only cost the fast path
+        pass
+    return config
@@ -0,0 +1,159 @@
+from typing import Iterable, Iterator
+import argparse
+import mmap
+import os
+import sys
+
+
+def _line(data, start: int, end: int) -> bytes:
+    # lines may end with \r\n as well as \n
+    line = data[start:end]
+    return line[:-1] if line.endswith(b"\r") else line
+
+
+def iter_lines(data) -> Iterator[bytes]:
+    """
+    yields the lines of a values file, without line endings
+    :param data: bytes or mmap of the file
+    :return:
+    """
+    start = 0
+    size = len(data)
+    while start < size:
+        end = data.find(b"\n", start)
+        if end == -1:
+            end = size
+        yield _line(data, start, end)
+        start = end + 1
+
+
+def read_values(data: bytes) -> frozenset:
+    """
+    returns the values of a values file as a set, empty lines are ignored
+    :param data: contents of the file
+    :return:
+    """
+    return frozenset(line.decode("utf-8") for line in iter_lines(data) if len(line) > 0)
+
+
+class SortedTable():
+    """
+    Read-only set of strings backed by a memory-mapped file.
+
+    The file contains one value per line, sorted bytewise (e.g. with `LC_ALL=C sort -u`). Lines may end with
+    \r\n, empty lines are ignored. The order is not checked here, since every process mapping the file would pay
+    for it, unsorted files give wrong answers (use verify_sorted_table when the file is prepared).
+    Lookups are a binary search over the mapping, so the table is never loaded into the heap
+    and the pages are shared between all processes mapping the same file.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.file = open(path, "rb")
+        self.size = os.fstat(self.file.fileno()).st_size
+        # mmap refuses to map empty files
+        self.mm = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ) if self.size > 0 else b""
+
+    def __contains__(self, value: str) -> bool:
+        if not isinstance(value, str):
+            return False
+        key = value.encode("utf-8")
+        if len(key) == 0:
+            return False
+        mm = self.mm
+        lo = 0
+        hi = self.size
+        # lo and hi always point to the start of a line (or the end of the file)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            start = mm.rfind(b"\n", lo, mid) + 1 or lo
+            end = mm.find(b"\n", start, hi)
+            if end == -1:
+                end = hi
+            line = _line(mm, start, end)
+            # empty lines sort first, so they never lead the search away from a value
+            if line == key:
+                return True
+            if line < key:
+                lo = end + 1
+            else:
+                hi = start
+        return False
+
+    def value_at(self, offset: int) -> str:
+        """
+        returns the value of the line containing offset, e.g. to pick random values
+        :param offset: byte offset into the file
+        :return:
+        """
+        start = self.mm.rfind(b"\n", 0, offset) + 1
+        while True:
+            end = self.mm.find(b"\n", start)
+            if end == -1:
+                end = self.size
+            line = _line(self.mm, start, end)
+            # empty lines are only at the start of a sorted file, the last line is never empty
+            if len(line) > 0:
+                return line.decode("utf-8")
+            start = end + 1
+
+    def close(self):
+        if self.size > 0:
+            self.mm.close()
+        self.file.close()
+
+
+def write_sorted_table(path: str, values: Iterable[str]):
+    """
+    Writes values to path in the format expected by SortedTable.
+    :param path: file to write
+    :param values: values to store, duplicates are removed
+    :return:
+    """
+    lines = sorted(set(v.encode("utf-8") for v in values))
+    for line in lines:
+        if b"\n" in line:
+            raise ValueError(f"Value {line!r} must not contain newlines")
+
+    with open(path, "wb") as f:
+        f.write(b"\n".join(lines))
+        if len(lines) > 0:
+            f.write(b"\n")
+
+
+def verify_sorted_table(path: str):
+    """
+    Checks that a file can be used as a SortedTable, i.e. that its lines are sorted bytewise.
+    :param path: file to check
+    :raises ValueError: if the file is not sorted
+    :return:
+    """
+    with open(path, "rb") as f:
+        data = f.read()
+
+    previous = b""
+    for line in iter_lines(data):
+        if line < previous:
+            raise ValueError(f"{path} is not sorted, {line!r} comes after {previous!r}")
+        previous = line
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="prepares values files for enum fields")
+    parser.add_argument("file", nargs="+", help="values file to sort in place")
+    parser.add_argument("--check", action="store_true", help="only check that the files are sorted")
+    args = parser.parse_args()
+
+    failed = False
+    for path in args.file:
+        if args.check:
+            try:
+                verify_sorted_table(path)
+            except ValueError as e:
+                print(e, file=sys.stderr)
+                failed = True
+        else:
+            with open(path, "rb") as f:
+                values = read_values(f.read())
+            write_sorted_table(path, values)
+    sys.exit(1 if failed else 0)
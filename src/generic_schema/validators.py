@@ -1,8 +1,92 @@
-from typing import Any, List, Dict, Optional
-import os, re
+from typing import Any, Iterable, List, Dict, Optional
+import functools
+import itertools
+import math
+import os, random, re, time
+
+from generic_schema.sorted_table import SortedTable, read_values
+
+# number of items at the start and the end of a sampled array that are always validated
+DEFAULT_SAMPLE_EDGES = 16
+
+# values files larger than this are memory-mapped and binary searched instead of loaded into a set
+MMAP_THRESHOLD = 64 * 1024
+
+
+class BudgetExceededError(ValueError):
+    """
+    Raised when a validation exceeds its Budget.
+    """
+
+
+class Budget():
+    """
+    Limits for a single validation, so untrusted input cannot stall it. The time budget starts when the
+    Budget is created, so a new one is needed for every validation.
+    """
+
+    def __init__(self, timeout: Optional[float] = None, max_depth: Optional[int] = None,
+                 max_array_len: Optional[int] = None, max_string_len: Optional[int] = None):
+        """
+        :param timeout: seconds the validation may take
+        :param max_depth: maximum nesting of tables and arrays
+        :param max_array_len: maximum number of items of an array
+        :param max_string_len: maximum length of a string, checked before any regex runs
+        """
+        self.timeout = timeout
+        self.deadline = time.monotonic() + timeout if timeout is not None else None
+        self.max_depth = max_depth
+        self.max_array_len = max_array_len
+        self.max_string_len = max_string_len
+        self.depth = 0
+
+    def check(self, name: str, value: Any):
+        """
+        raises BudgetExceededError if the time is up or the value is too large
+        :param name: name of the field
+        :param value: value that is about to be validated
+        :return:
+        """
+        if self.deadline is not None and time.monotonic() > self.deadline:
+            raise BudgetExceededError(f"{name}: validation took longer than {self.timeout}s")
+
+        if isinstance(value, str):
+            if self.max_string_len is not None and len(value) > self.max_string_len:
+                raise BudgetExceededError(f"{name}: string is longer than {self.max_string_len} characters")
+        elif isinstance(value, list):
+            if self.max_array_len is not None and len(value) > self.max_array_len:
+                raise BudgetExceededError(f"{name}: array has more than {self.max_array_len} items")
+
+    def enter(self, name: str):
+        """
+        called when validation descends into a table or array
+        :param name: name of the field
+        :return:
+        """
+        if self.max_depth is not None and self.depth >= self.max_depth:
+            raise BudgetExceededError(f"{name}: nesting is deeper than {self.max_depth}")
+        self.depth += 1
+
+    def leave(self):
+        self.depth -= 1
+
+    def guard(self, name: str, validate):
+        """
+        returns validate wrapped so that every value is checked against the budget first
+        :param name: name of the field
+        :param validate: function taking the value
+        :return:
+        """
+        def guarded(value):
+            self.check(name, value)
+            return validate(value)
+        return guarded
 
 
 class Validator():
+    # estimated relative cost of a validation, CompiledSchema runs cheap checks first
+    cost = 1
+
     def __init__(self, name: str):
         self.name = name
 
@@ -13,13 +97,13 @@ class Validator():
         :param check: Dictionary item loaded from the toml file
         :return:
         """
-        if not "default" in check.keys():
-            if value is None:
+        if value is None:
+            if not "default" in check.keys():
                 raise ValueError(f"Missing field {self.name}")
 
-            return value
+            return check["default"]
 
-        return check["default"]
+        return value
 
 
 class BooleanValidator(Validator):
@@ -127,6 +211,8 @@ class DoubleValidator(NumberValidator):
 
 
 class StringValidator(Validator):
+    cost = 2
+
     def __init__(self, name: str):
         super().__init__(name=name)
 
@@ -152,6 +238,8 @@ class StringValidator(Validator):
 
 
 class RegExValidator(StringValidator):
+    cost = 10
+
     def __init__(self, name: str, regex: Optional[str] = None):
         super().__init__(name=name)
         self.regex = regex
@@ -179,9 +267,14 @@ class RegExValidator(StringValidator):
 
 
 class EMailValidator(Validator):
+    cost = 10
+
     def validate(self, value: Any, check: Dict[str, Any]) -> bool:
         value = super().validate(value, check)
 
+        if not isinstance(value, str):
+            raise ValueError("Value must be a string")
+
         # from https://emailregex.com/index.html
         pattern = re.compile(r"(^[a-zA-Z0-9_.+-]+@[a-zA-Z0-9-]+\.[a-zA-Z0-9-.]+$)")
         if not pattern.match(value):
@@ -191,9 +284,14 @@ class EMailValidator(Validator):
 
 
 class FileValidator(Validator):
+    cost = 100
+
     def validate(self, value: Any, check: Dict[str, Any]) -> bool:
         value = super().validate(value, check)
 
+        if not isinstance(value, str):
+            raise ValueError("Value must be a string")
+
         if check.get("exists", True):
             if not os.path.exists(value):
                 raise ValueError(f"File {value} does not exist")
@@ -206,9 +304,14 @@ class FileValidator(Validator):
 
 
 class DirectoryValidator(Validator):
+    cost = 100
+
     def validate(self, value: Optional[str], check: Dict[str, Any]) -> Optional[str]:
         value = super().validate(value, check)
 
+        if not isinstance(value, str):
+            raise ValueError("Value must be a string")
+
         if check.get("exists", True):
             if not os.path.exists(value):
                 raise ValueError(f"File {value} does not exist")
@@ -220,35 +323,196 @@ class DirectoryValidator(Validator):
         return value
 
 
+@functools.lru_cache(maxsize=64)
+def _load_values_file(path: str, mtime_ns: int, size: int):
+    # mtime and size are part of the cache key, so a changed file is loaded again
+    if size > MMAP_THRESHOLD:
+        return SortedTable(path)
+
+    with open(path, "rb") as f:
+        return read_values(f.read())
+
+
+def load_values_file(path: str):
+    """
+    Loads a file with one allowed value per line.
+
+    Small files are loaded into a frozenset, large files are memory-mapped as a SortedTable and have to be
+    sorted bytewise (see verify_sorted_table). The result is cached until the file changes.
+    :param path: path of the values file
+    :return: a container supporting the in operator
+    """
+    st = os.stat(path)
+    return _load_values_file(os.path.abspath(path), st.st_mtime_ns, st.st_size)
+
+
+class EnumValidator(Validator):
+    cost = 2
+
+    def __init__(self, name: str, values: Optional[List] = None, values_file: Optional[str] = None):
+        self.values = frozenset(values) if values is not None else None
+        self.values_file = values_file
+        if values_file is not None:
+            # binary search in a possibly memory-mapped file
+            self.cost = 4
+        super().__init__(name=name)
+
+    def allowed(self, check: Dict[str, Any]):
+        """
+        returns the container of allowed values, values files are looked up on every call (load_values_file caches
+        them until the file changes)
+        :param check: Dictionary item loaded from the toml file
+        :return:
+        """
+        if self.values is not None:
+            return self.values
+        if self.values_file is not None:
+            return load_values_file(self.values_file)
+
+        if "values" in check.keys():
+            return frozenset(check["values"])
+        if "values_file" in check.keys():
+            return load_values_file(check["values_file"])
+        raise ValueError("No values specified")
+
+    def validate(self, value: Any, check: Dict[str, Any], allowed=None) -> Any:
+        """
+        Validates that a value is one of the allowed values.
+        :param value:
+        :param check: Dictionary item loaded from the toml file, allowed values are given inline in "values"
+                      or as a file with one string per line in "values_file"
+        :param allowed: container returned by allowed(check), arrays look it up once for all their items
+        :return:
+        """
+        value = super().validate(value, check)
+        if allowed is None:
+            allowed = self.allowed(check)
+
+        try:
+            if value in allowed:
+                return value
+        except TypeError:
+            # unhashable values can never be in the set
+            pass
+
+        raise ValueError(f"{self.name}: {value} is not one of the allowed values")
+
+
 class ArrayValidator(Validator):
     def __init__(self, name: str, subtype: Validator, subtype_check: dict, minlen = None, maxlen = None):
         self.subtype = subtype
         self.subtype_check = subtype_check
         self.minlen = minlen
         self.maxlen = maxlen
+        # every item is validated, assume a few of them
+        self.cost = 1 + 10 * subtype.cost
         super().__init__(name)
 
-    def validate(self, value: Optional[List], check: Dict[str, Any]) -> Optional[List]:
+    def sample_indices(self, length: int, check: Dict[str, Any]) -> Optional[Iterable[int]]:
+        """
+        returns the indices of the items to validate if the check enables sampling
+        :param length: number of items in the array
+        :param check: Dictionary item loaded from the toml file, sampling is configured with "sample_rate"
+                      (fraction of the items between the edges to validate), "sample_edges" (number of items at the
+                      start and the end that are always validated), "sample_mode" ("strided" or "random") and
+                      "sample_seed"
+        :return: None if all items have to be validated
+        """
+        rate = check.get("sample_rate", None)
+        if rate is None:
+            return None
+        if not isinstance(rate, (int, float)) or isinstance(rate, bool) or rate < 0:
+            raise ValueError(f"{self.name}: sample_rate must be a number between 0 and 1")
+        if rate >= 1:
+            return None
+
+        edges = check.get("sample_edges", DEFAULT_SAMPLE_EDGES)
+        if not isinstance(edges, int) or isinstance(edges, bool) or edges < 0:
+            raise ValueError(f"{self.name}: sample_edges must be a non-negative integer")
+        if length <= 2 * edges:
+            return None
+
+        middle = range(edges, length - edges)
+        mode = check.get("sample_mode", "strided")
+        if rate == 0:
+            sample = range(0)
+        elif mode == "strided":
+            # evenly spaced, so exactly the requested fraction is validated. Integer arithmetic keeps the indices
+            # distinct and inside the middle, float division can round up to len(middle)
+            n = len(middle)
+            k = math.ceil(rate * n)
+            sample = (edges + (i * n) // k for i in range(k))
+        elif mode == "random":
+            rng = random.Random(check["sample_seed"]) if "sample_seed" in check.keys() else random
+            sample = sorted(rng.sample(middle, math.ceil(rate * len(middle))))
+        else:
+            raise ValueError(f"{self.name}: unknown sample_mode {mode}")
+
+        return itertools.chain(range(edges), sample, range(length - edges, length))
+
+    def validate(self, value: Optional[List], check: Dict[str, Any], full_check: bool = False,
+                 coverage: Optional[Dict[str, List[int]]] = None, budget: Optional[Budget] = None) -> Optional[List]:
+        """
+        Validates a list and its items.
+        :param value:
+        :param check: Dictionary item loaded from the toml file
+        :param full_check: if True, all items are validated even if the check enables sampling
+        :param coverage: if given, [validated items, total items] is added up for this array (by name)
+        :param budget: if given, the array and every validated item are checked against it
+        :return:
+        """
         value = super().validate(value, check)
+        if budget is not None:
+            budget.check(self.name, value)
+            budget.enter(self.name)
 
-        if not isinstance(value, list):
-            raise ValueError(f"{self.name}: {value} is not a list")
+        try:
+            if not isinstance(value, list):
+                raise ValueError(f"{self.name}: {value} is not a list")
 
-        minlen = check.get("minlen", None)
-        if minlen is not None:
-            if len(value) < minlen:
-                raise ValueError(f"{self.name}: {value} has not enough items ({minlen})")
+            minlen = check.get("minlen", None)
+            if minlen is not None:
+                if len(value) < minlen:
+                    raise ValueError(f"{self.name}: {value} has not enough items ({minlen})")
 
-        maxlen = check.get("maxlen", None)
-        if maxlen is not None:
-            if len(value) > maxlen:
-                raise ValueError(f"{self.name}: {value} has too many items ({maxlen})")
+            maxlen = check.get("maxlen", None)
+            if maxlen is not None:
+                if len(value) > maxlen:
+                    raise ValueError(f"{self.name}: {value} has too many items ({maxlen})")
 
-        ret = []
-        for v in value:
             # the array gets the subtype_check always from parse_validator
-            ret.append(self.subtype.validate(v, self.subtype_check))
+            subtype_check = self.subtype_check
+            if isinstance(self.subtype, ArrayValidator):
+                validate_item = functools.partial(self.subtype.validate, check=subtype_check, full_check=full_check,
+                                                  coverage=coverage, budget=budget)
+            elif isinstance(self.subtype, EnumValidator) and len(value) > 0:
+                # look up the values file once instead of calling stat for every item
+                validate_item = functools.partial(self.subtype.validate, check=subtype_check,
+                                                  allowed=self.subtype.allowed(subtype_check))
+            else:
+                validate_item = functools.partial(self.subtype.validate, check=subtype_check)
+            if budget is not None:
+                validate_item = budget.guard(self.subtype.name, validate_item)
+
+            indices = None if full_check else self.sample_indices(len(value), check)
+            if indices is None:
+                for v in value:
+                    validate_item(v)
+                checked = len(value)
+            else:
+                checked = 0
+                for i in indices:
+                    validate_item(value[i])
+                    checked += 1
+
+            if coverage is not None:
+                counts = coverage.setdefault(self.name, [0, 0])
+                counts[0] += checked
+                counts[1] += len(value)
 
-        return value
+            return value
+        finally:
+            if budget is not None:
+                budget.leave()
 
 
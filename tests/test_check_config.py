@@ -0,0 +1,122 @@
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+
+import pytest
+
+from generic_schema.check_client import check_remote, recv_message, send_message
+from generic_schema.check_config import CheckServer, SchemaCache, check_file
+
+
+@pytest.fixture
+def files():
+    with tempfile.TemporaryDirectory() as dir:
+        schema_path = os.path.join(dir, "schema.toml")
+        with open(schema_path, "w") as f:
+            f.write('x = {_type = "int16", min = 1, max = 42}\n[nested]\na = "uint8"\n')
+
+        valid_path = os.path.join(dir, "valid.json")
+        with open(valid_path, "w") as f:
+            json.dump({"x": 1, "nested": {"a": 1}}, f)
+
+        invalid_path = os.path.join(dir, "invalid.json")
+        with open(invalid_path, "w") as f:
+            json.dump({"x": 43, "nested": {"a": 1}}, f)
+
+        yield dir, schema_path, valid_path, invalid_path
+
+
+def test_check_file(files):
+    dir, schema_path, valid_path, invalid_path = files
+
+    assert(check_file(valid_path, schema_path) is None)
+    assert("Error in field x" in check_file(invalid_path, schema_path))
+    assert(check_file(os.path.join(dir, "missing.json"), schema_path) is not None)
+    assert(check_file(valid_path, os.path.join(dir, "missing.toml")) is not None)
+
+
+def test_schema_cache(files):
+    dir, schema_path, valid_path, invalid_path = files
+
+    cache = SchemaCache()
+    schema = cache.get(schema_path)
+    assert(cache.get(schema_path) is schema)
+
+    with open(schema_path, "a") as f:
+        f.write('b = "uint8"\n')
+    assert(cache.get(schema_path) is not schema)
+    assert("Missing key b" in check_file(valid_path, schema_path, cache))
+
+
+def test_check_malformed(files):
+    dir, schema_path, valid_path, invalid_path = files
+
+    list_path = os.path.join(dir, "list.json")
+    with open(list_path, "w") as f:
+        json.dump([1, 2], f)
+    assert("config must be a table" in check_file(list_path, schema_path))
+
+    for i, schema in enumerate(['arr = {_type = "array"}\n', 'x = {_type = "int16", min = "x"}\n']):
+        bad_schema_path = os.path.join(dir, f"bad{i}.toml")
+        with open(bad_schema_path, "w") as f:
+            f.write(schema)
+        assert(check_file(valid_path, bad_schema_path).startswith("Invalid schema"))
+
+
+def test_server(files):
+    dir, schema_path, valid_path, invalid_path = files
+    socket_path = os.path.join(dir, "check.sock")
+
+    with CheckServer(socket_path) as server:
+        thread = threading.Thread(target=server.serve_forever)
+        thread.start()
+        try:
+            assert(check_remote(socket_path, valid_path, schema_path) is None)
+            assert("Error in field x" in check_remote(socket_path, invalid_path, schema_path))
+            assert(len(server.cache.schemas) == 1)
+
+            # malformed schemas and configs get an answer and do not break the server
+            bad_schema_path = os.path.join(dir, "bad.toml")
+            with open(bad_schema_path, "w") as f:
+                f.write('arr = {_type = "array"}\n')
+            assert("Missing subtype" in check_remote(socket_path, valid_path, bad_schema_path))
+
+            list_path = os.path.join(dir, "list.json")
+            with open(list_path, "w") as f:
+                json.dump([1, 2], f)
+            assert("must be a table" in check_remote(socket_path, list_path, schema_path))
+            assert(check_remote(socket_path, valid_path, schema_path) is None)
+
+            # integers must not be used as file descriptors of the server
+            for request in [{"config": 3, "schema": schema_path}, {"config": valid_path, "schema": 4}]:
+                with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+                    sock.connect(socket_path)
+                    send_message(sock, request)
+                    response = recv_message(sock)
+                assert(response["ok"] is False)
+                assert("must be paths" in response["error"])
+            assert(check_remote(socket_path, valid_path, schema_path) is None)
+
+            result = subprocess.run([sys.executable, "-m", "generic_schema.check_config", invalid_path,
+                                     "-s", schema_path, "--socket", socket_path],
+                                    capture_output=True, text=True, env=dict(os.environ, PYTHONPATH=os.pathsep.join(sys.path)))
+            assert(result.returncode == 1)
+            assert("Error in field x" in result.stderr)
+
+            result = subprocess.run([sys.executable, "-m", "generic_schema.check_client", invalid_path,
+                                     "-s", schema_path, "--socket", socket_path],
+                                    capture_output=True, text=True, env=dict(os.environ, PYTHONPATH=os.pathsep.join(sys.path)))
+            assert(result.returncode == 1)
+            assert("Error in field x" in result.stderr)
+        finally:
+            server.shutdown()
+            thread.join()
+
+    # the client starts without loading the validators
+    code = "import sys, generic_schema.check_client; sys.exit('generic_schema.validators' in sys.modules)"
+    result = subprocess.run([sys.executable, "-c", code], env=dict(os.environ, PYTHONPATH=os.pathsep.join(sys.path)))
+    assert(result.returncode == 0)
@@ -0,0 +1,115 @@
+import io
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+
+import pytest
+
+from generic_schema.generator import generate_configs, generate_value, mutate_config, write_ndjson
+from generic_schema.parse_validator import CompiledSchema, parse_validator, validate_config
+from generic_schema.sorted_table import write_sorted_table
+
+schema = {"x": {"_type": "int16", "min": 1, "max": 42},
+          "small": "int8",
+          "big": "uint64",
+          "ratio": {"_type": "double", "min": 1.5, "max": 2.0},
+          "switch": "bool",
+          "optional": {"_type": "bool", "default": False},
+          "name": {"_type": "string", "min": 2, "max": 5},
+          "mail": "email",
+          "version": "version",
+          "uri": "uri",
+          "region": {"_type": "enum", "values": ["eu", "us"]},
+          "file": "file",
+          "dir": "dir",
+          "array_int": {"_type": "array", "subtype": {"_type": "int16", "min": 1, "max": 42}, "minlen": 1, "maxlen": 10},
+          "nested": {"a": "uint8", "b": {"_type": "array", "subtype": {"_type": "array", "subtype": "str"}}}}
+
+
+def test_generate_valid():
+    configs = list(generate_configs(schema, 200, seed=1))
+    assert(len(configs) == 200)
+    for config in configs:
+        validate_config(config, schema)
+        assert(1 <= len(config["array_int"]) <= 10)
+        assert(2 <= len(config["name"]) <= 5)
+        assert(-128 <= config["small"] <= 127)
+
+    assert(configs == list(generate_configs(schema, 200, seed=1)))
+
+
+def test_generate_invalid():
+    for config in generate_configs(schema, 200, seed=2, invalid=True):
+        with pytest.raises(ValueError):
+            validate_config(config, schema)
+
+    compiled = CompiledSchema({"x": "int8"})
+    config = mutate_config({"x": 1}, compiled, random.Random(0), mutations=["missing"])
+    assert(config == {})
+    config = mutate_config({"x": 1}, compiled, random.Random(0), mutations=["range"])
+    assert(config["x"] in [-129, 128])
+
+    with pytest.raises(ValueError):
+        mutate_config({"x": 1}, CompiledSchema({"x": {"_type": "int8", "default": 1}}), random.Random(0),
+                      mutations=["missing"])
+
+
+def test_generate_values():
+    rng = random.Random(0)
+    with pytest.raises(TypeError):
+        generate_value(parse_validator("re", {"_type": "regex", "regex": "^a$"}), {"regex": "^a$"}, rng)
+    assert(generate_value(parse_validator("re", "regex"), {"regex": "^a$", "default": "a"}, rng) == "a")
+
+    # a single float bound still gives a valid range
+    for check in [{"_type": "double", "max": -5e6}, {"_type": "double", "min": 5e6}]:
+        validator = parse_validator("ratio", check)
+        for _ in range(100):
+            validator.validate(generate_value(validator, check, rng), check)
+
+    check = {"_type": "enum", "values": []}
+    with pytest.raises(TypeError):
+        generate_value(parse_validator("region", check), check, rng)
+
+    with tempfile.TemporaryDirectory() as dir:
+        path = os.path.join(dir, "skus.txt")
+        skus = [f"SKU-{i:08d}" for i in range(20000)]
+        write_sorted_table(path, skus)
+        check = {"_type": "enum", "values_file": path}
+        validator = parse_validator("sku", check)
+        for _ in range(100):
+            assert(validator.validate(generate_value(validator, check, rng), check))
+
+        path = os.path.join(dir, "empty.txt")
+        write_sorted_table(path, [])
+        check = {"_type": "enum", "values_file": path}
+        with pytest.raises(TypeError):
+            generate_value(parse_validator("sku", check), check, rng)
+
+
+def test_write_ndjson():
+    out = io.StringIO()
+    write_ndjson(out, generate_configs(schema, 10, seed=3), batch=3)
+    lines = out.getvalue().split("\n")
+    assert(lines[-1] == "")
+    assert([json.loads(line) for line in lines[:-1]] == list(generate_configs(schema, 10, seed=3)))
+
+
+def test_generator_cli():
+    with tempfile.TemporaryDirectory() as dir:
+        schema_path = os.path.join(dir, "schema.json")
+        with open(schema_path, "w") as f:
+            json.dump(schema, f)
+        valid_path = os.path.join(dir, "valid.ndjson")
+        invalid_path = os.path.join(dir, "invalid.ndjson")
+
+        subprocess.run([sys.executable, "-m", "generic_schema.generator", schema_path, "-n", "5", "-o", valid_path,
+                        "--invalid", "3", "--invalid-output", invalid_path, "--seed", "4"],
+                       check=True, env=dict(os.environ, PYTHONPATH=os.pathsep.join(sys.path)))
+
+        with open(valid_path) as f:
+            assert(len(f.readlines()) == 5)
+        with open(invalid_path) as f:
+            assert(len(f.readlines()) == 3)
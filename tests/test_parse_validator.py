@@ -1,10 +1,14 @@
+import threading
+
 import pytest
 
 from generic_schema.extra_validators import VersionValidator, URIValidator
-from generic_schema.parse_validator import parse_validator, validate_config, validate_type, validate_config_key
-from generic_schema.validators import Int8Validator, Int16Validator, Int32Validator, Int64Validator, UInt8Validator, \
-    UInt16Validator, UInt32Validator, UInt64Validator, FloatValidator, DoubleValidator, StringValidator, \
-    BooleanValidator, ArrayValidator, RegExValidator, EMailValidator, FileValidator, DirectoryValidator
+from generic_schema.parse_validator import parse_validator, validate_config, validate_type, validate_config_key, \
+    CompiledSchema
+from generic_schema.validators import Budget, BudgetExceededError, Int8Validator, Int16Validator, Int32Validator, \
+    Int64Validator, UInt8Validator, UInt16Validator, UInt32Validator, UInt64Validator, FloatValidator, \
+    DoubleValidator, StringValidator, BooleanValidator, ArrayValidator, RegExValidator, EMailValidator, FileValidator, \
+    DirectoryValidator, EnumValidator
 
 
 def test_parse_validator():
@@ -84,6 +88,11 @@ def test_parse_validator():
     assert(isinstance(urivalidator, URIValidator))
     assert(urivalidator.name == "uri")
 
+    enumvalidator = parse_validator("enum", {"_type": "oneof", "values": ["a", "b"]})
+    assert(isinstance(enumvalidator, EnumValidator))
+    assert(enumvalidator.name == "enum")
+    assert(enumvalidator.values == frozenset(["a", "b"]))
+
     with pytest.raises(TypeError):
         parse_validator("invalid", {"_type": "invalid"})
 
@@ -131,6 +140,174 @@ def test_validate_config():
         validate_config(config, schema)
 
 
+def test_validate_config_defaults():
+    schema = {"test1": {"_type": "int8", "default": 5},
+              "test2": "string",
+              "test3": {"test4": {"_type": "bool", "default": False}}}
+
+    config = {"test2": "test", "test3": {"test4": None}}
+    ret = validate_config(config, schema)
+    assert(ret == {"test1": 5, "test2": "test", "test3": {"test4": False}})
+    assert(config == {"test2": "test", "test3": {"test4": None}})
+
+    # given values are not replaced by the default
+    config = {"test1": 7, "test2": "test", "test3": {"test4": True}}
+    assert(validate_config(config, schema) == config)
+
+
+def test_validate_config_inplace():
+    schema = {"test1": {"_type": "int8", "default": 5},
+              "test2": {"_type": "array", "subtype": "string"},
+              "test3": {"test4": {"_type": "bool", "default": False}}}
+
+    items = ["a", "b"]
+    nested = {"test4": None}
+    config = {"test2": items, "test3": nested}
+    ret = validate_config(config, schema, inplace=True)
+    assert(ret is config)
+    assert(ret["test2"] is items)
+    assert(ret["test3"] is nested)
+    assert(config == {"test2": ["a", "b"], "test3": {"test4": False}, "test1": 5})
+
+    config = {"test1": 1000, "test2": items, "test3": nested}
+    with pytest.raises(ValueError):
+        validate_config(config, schema, inplace=True)
+
+    # a failed validation does not leave defaults behind, also not in nested tables that were valid
+    schema = {"test1": {"_type": "int8", "default": 5},
+              "test3": {"test4": {"_type": "bool", "default": False}},
+              "test5": {"_type": "regex", "regex": "^a$"}}
+    config = {"test3": {}, "test5": "b"}
+    with pytest.raises(ValueError):
+        validate_config(config, schema, inplace=True)
+    assert(config == {"test3": {}, "test5": "b"})
+
+
+def test_compiled_schema():
+    schema = CompiledSchema({"test1": {"_type": "int8", "min": 0, "max": 10},
+                             "test3": {"test4": "uint8"}})
+    assert(isinstance(schema.entries[0][1], Int8Validator))
+    assert(isinstance(schema.entries[1][1], CompiledSchema))
+    assert(schema.entries[1][1].entries[0][1].name == "test3.test4")
+
+    for i in range(3):
+        config = {"test1": i, "test3": {"test4": i}}
+        assert(schema.validate(config) == config)
+
+    with pytest.raises(ValueError):
+        schema.validate({"test1": 1, "test3": 5})
+
+
+def test_compiled_schema_order():
+    schema = CompiledSchema({"file": "file",
+                             "name": {"_type": "regex", "regex": "^[a-z]+$"},
+                             "tags": {"_type": "array", "subtype": "string"},
+                             "text": "string",
+                             "x": "int8",
+                             "y": "bool"})
+    assert([entry[0] for entry in schema.entries] == ["x", "y", "text", "name", "tags", "file"])
+
+    # the cheap check fails before the file is looked at
+    with pytest.raises(ValueError, match="field x"):
+        schema.validate({"file": "/does/not/exist", "name": "abc", "tags": [], "text": "", "x": "a", "y": True})
+
+    config = {"file": __file__, "name": "abc", "tags": [], "text": "", "x": 1, "y": True}
+    assert(list(schema.validate(config).keys()) == list(config.keys()))
+
+
+def test_compiled_schema_adaptive():
+    schema = CompiledSchema({"x": "int8", "y": "int8", "z": "int8"}, adaptive=True)
+
+    for i in range(3):
+        with pytest.raises(ValueError, match="field z"):
+            schema.validate({"x": 1, "y": 1, "z": "a"})
+    assert([entry[0] for entry in schema.entries] == ["z", "x", "y"])
+
+    for i in range(4):
+        with pytest.raises(ValueError, match="field y"):
+            schema.validate({"x": 1, "y": "a", "z": 1})
+    assert([entry[0] for entry in schema.entries] == ["y", "z", "x"])
+    assert(schema.failures == {"z": 3, "y": 4})
+
+    # failures counted from many threads are neither lost nor duplicate entries
+    schema = CompiledSchema({"x": "int8", "y": "int8", "z": "int8"}, adaptive=True)
+
+    def fail(config):
+        for _ in range(200):
+            with pytest.raises(ValueError):
+                schema.validate(config)
+
+    threads = [threading.Thread(target=fail, args=({"x": 1, "y": "a", "z": "a"} if i % 2 else
+                                                   {"x": "a", "y": 1, "z": 1},)) for i in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert(sum(schema.failures.values()) == 8 * 200)
+    assert(sorted(entry[0] for entry in schema.entries) == ["x", "y", "z"])
+
+    # without adaptive the order stays fixed
+    schema = CompiledSchema({"x": "int8", "y": "int8", "z": "int8"})
+    with pytest.raises(ValueError):
+        schema.validate({"x": 1, "y": 1, "z": "a"})
+    assert([entry[0] for entry in schema.entries] == ["x", "y", "z"])
+
+
+def test_validate_config_sampling():
+    schema = {"test1": {"items": {"_type": "array", "subtype": "uint8", "sample_rate": 0.01}}}
+    config = {"test1": {"items": [1] * 10000}}
+
+    coverage = {}
+    assert(validate_config(config, schema, coverage=coverage) == config)
+    assert(coverage == {"test1.items": [32 + 100, 10000]})
+
+    coverage = {}
+    assert(validate_config(config, schema, full_check=True, coverage=coverage) == config)
+    assert(coverage == {"test1.items": [10000, 10000]})
+
+    coverage = {}
+    assert(validate_type([1] * 10000, schema["test1"]["items"], coverage=coverage) == [1] * 10000)
+    assert(coverage == {"value": [32 + 100, 10000]})
+
+
+def test_validate_config_budget():
+    schema = {"name": {"_type": "regex", "regex": "^(a+)+$"},
+              "nested": {"deeper": {"x": "int8"}}}
+    config = {"name": "aaaa", "nested": {"deeper": {"x": 1}}}
+
+    assert(validate_config(config, schema, budget=Budget(timeout=10, max_depth=3, max_string_len=4)) == config)
+
+    with pytest.raises(BudgetExceededError, match="name: string is longer than 3"):
+        validate_config(config, schema, budget=Budget(max_string_len=3))
+    with pytest.raises(BudgetExceededError, match="nested.deeper: nesting is deeper than 2"):
+        validate_config(config, schema, budget=Budget(max_depth=2))
+    with pytest.raises(BudgetExceededError):
+        validate_config(config, schema, budget=Budget(timeout=-1))
+
+    # the depth is restored after a failed validation, so the budget can be used again
+    budget = Budget(max_depth=3)
+    with pytest.raises(ValueError):
+        validate_config({"name": "b", "nested": {"deeper": {"x": 1000}}}, schema, budget=budget)
+    assert(budget.depth == 0)
+    assert(validate_config(config, schema, budget=budget) == config)
+
+    with pytest.raises(BudgetExceededError):
+        validate_type("a" * 100, "regex", budget=Budget(max_string_len=10))
+
+    # budget errors are not counted as failures of the field
+    compiled = CompiledSchema(schema, adaptive=True)
+    with pytest.raises(BudgetExceededError):
+        compiled.validate(config, budget=Budget(max_string_len=3))
+    assert(compiled.failures == {})
+
+
+def test_validate_enum():
+    schema = {"region": {"_type": "enum", "values": ["eu", "us"]}}
+    assert(validate_config({"region": "eu"}, schema) == {"region": "eu"})
+    with pytest.raises(ValueError):
+        validate_config({"region": "asia"}, schema)
+
+
 def test_validate_config_key():
     schema = {"test1": {"_type": "int8", "min": 0, "max": 10},
               "test2": {"_type": "string"}}
@@ -0,0 +1,112 @@
+import json
+import os
+import tempfile
+
+import pytest
+
+import generic_schema.snapshot
+from generic_schema.snapshot import write_snapshot, read_snapshot, load_config, schema_hash
+from generic_schema.sorted_table import write_sorted_table
+
+
+schema = {"test1": {"_type": "int8", "min": 0, "max": 10},
+          "test2": {"_type": "string"},
+          "test3": {"test4": {"_type": "array", "subtype": "int8"}}}
+config = {"test1": 5, "test2": "test", "test3": {"test4": [1, 2, 3]}}
+
+
+def test_snapshot_roundtrip():
+    with tempfile.TemporaryDirectory() as dir:
+        path = os.path.join(dir, "config.snapshot")
+        source = json.dumps(config).encode("utf-8")
+
+        assert(read_snapshot(path, schema, source) is None)
+
+        write_snapshot(path, config, schema, source)
+        assert(read_snapshot(path, schema, source) == config)
+
+        # stale source or schema
+        assert(read_snapshot(path, schema, source + b" ") is None)
+        assert(read_snapshot(path, {"test1": "int8"}, source) is None)
+
+        # truncated file
+        with open(path, "r+b") as f:
+            f.truncate(os.path.getsize(path) - 1)
+        assert(read_snapshot(path, schema, source) is None)
+
+        # payloads that are not a config
+        write_snapshot(path, [1, 2], schema, source)
+        assert(read_snapshot(path, schema, source) is None)
+
+        with pytest.raises(ValueError):
+            write_snapshot(path, {"test1": object()}, schema, source)
+
+
+def test_snapshot_environment(monkeypatch):
+    with tempfile.TemporaryDirectory() as dir:
+        path = os.path.join(dir, "config.snapshot")
+        source = json.dumps(config).encode("utf-8")
+        write_snapshot(path, config, schema, source)
+
+        monkeypatch.setattr(generic_schema.snapshot, "package_version", lambda: "999.0.0")
+        assert(read_snapshot(path, schema, source) is None)
+        monkeypatch.undo()
+        assert(read_snapshot(path, schema, source) == config)
+
+        # source trees without package metadata still notice changed validators
+        monkeypatch.setattr(generic_schema.snapshot, "SNAPSHOT_VERSION", generic_schema.snapshot.SNAPSHOT_VERSION + 1)
+        assert(read_snapshot(path, schema, source) is None)
+
+
+def test_snapshot_values_file():
+    with tempfile.TemporaryDirectory() as dir:
+        values_path = os.path.join(dir, "values.txt")
+        write_sorted_table(values_path, ["a", "b"])
+        values_schema = {"r": {"_type": "enum", "values_file": values_path}}
+
+        path = os.path.join(dir, "config.json")
+        with open(path, "w") as f:
+            json.dump({"r": "b"}, f)
+        assert(load_config(path, values_schema) == {"r": "b"})
+
+        write_sorted_table(values_path, ["a"])
+        os.utime(values_path, ns=(0, 0))
+        with pytest.raises(ValueError):
+            load_config(path, values_schema)
+
+
+def test_schema_hash():
+    assert(schema_hash({"a": "int8", "b": "str"}) == schema_hash({"b": "str", "a": "int8"}))
+    assert(schema_hash({"a": "int8"}) != schema_hash({"a": "int16"}))
+
+
+def test_load_config():
+    with tempfile.TemporaryDirectory() as dir:
+        path = os.path.join(dir, "config.json")
+        with open(path, "w") as f:
+            json.dump(config, f)
+
+        assert(load_config(path, schema) == config)
+        assert(os.path.exists(path + ".snapshot"))
+
+        # the snapshot is used instead of the file, so a tampered snapshot shows up
+        source = open(path, "rb").read()
+        write_snapshot(path + ".snapshot", {"from": "snapshot"}, schema, source)
+        assert(load_config(path, schema) == {"from": "snapshot"})
+
+        # changing the config invalidates the snapshot
+        with open(path, "w") as f:
+            json.dump(dict(config, test1=6), f)
+        assert(load_config(path, schema)["test1"] == 6)
+
+        with open(path, "w") as f:
+            json.dump(dict(config, test1=11), f)
+        with pytest.raises(ValueError):
+            load_config(path, schema)
+
+        path = os.path.join(dir, "config.toml")
+        with open(path, "w") as f:
+            f.write('test1 = 5\ntest2 = "test"\n[test3]\ntest4 = [1, 2, 3]\n')
+        snapshot_path = os.path.join(dir, "toml.snapshot")
+        assert(load_config(path, schema, snapshot_path=snapshot_path) == config)
+        assert(os.path.exists(snapshot_path))
@@ -1,10 +1,17 @@
+import math
 import tempfile
 import os
+import subprocess
+import sys
+import time
 
+from generic_schema import validators
 from generic_schema.extra_validators import VersionValidator
 from generic_schema.validators import NumberValidator, FloatValidator, DoubleValidator, Int8Validator, Int16Validator, \
     Int32Validator, Int64Validator, UInt8Validator, UInt16Validator, UInt32Validator, UInt64Validator, StringValidator, \
-    BooleanValidator, ArrayValidator, RegExValidator, EMailValidator, FileValidator, DirectoryValidator
+    BooleanValidator, ArrayValidator, RegExValidator, EMailValidator, FileValidator, DirectoryValidator, EnumValidator, \
+    Budget, BudgetExceededError
+from generic_schema.sorted_table import SortedTable, verify_sorted_table, write_sorted_table
 import pytest
 
 
@@ -149,6 +156,232 @@ def test_array_validators():
         assert(validator.validate({}, schema))
 
 
+def test_array_sampling():
+    validator = ArrayValidator("test", Int8Validator("test_arrayitem"), {})
+    value = list(range(100)) * 100
+
+    schema = {"sample_rate": 0.1, "sample_edges": 4}
+    coverage = {}
+    assert(validator.validate(value, schema, coverage=coverage) is value)
+    assert(coverage == {"test": [8 + 1000, 10000]})
+
+    # invalid items at the edges are always found
+    for i in [0, 3, -4, -1]:
+        broken = list(value)
+        broken[i] = 1000
+        with pytest.raises(ValueError):
+            validator.validate(broken, schema)
+
+    # an invalid item between the samples is missed unless everything is checked
+    broken = list(value)
+    broken[15] = 1000
+    assert(validator.validate(broken, schema) is broken)
+    coverage = {}
+    with pytest.raises(ValueError):
+        validator.validate(broken, schema, full_check=True, coverage=coverage)
+
+    schema = {"sample_rate": 0.25, "sample_mode": "random", "sample_seed": 1}
+    coverage = {}
+    validator.validate(value, schema, coverage=coverage)
+    validator.validate(value, schema, coverage=coverage)
+    assert(coverage == {"test": [2 * (32 + 2492), 20000]})
+    assert(list(validator.sample_indices(len(value), schema)) == list(validator.sample_indices(len(value), schema)))
+
+    coverage = {}
+    validator.validate(value, {"sample_rate": 0}, coverage=coverage)
+    assert(coverage == {"test": [32, 10000]})
+
+    # small arrays and missing/full sample rates check everything
+    assert(validator.sample_indices(32, {"sample_rate": 0.1}) is None)
+    assert(validator.sample_indices(len(value), {"sample_rate": 1}) is None)
+    assert(validator.sample_indices(len(value), {}) is None)
+
+    with pytest.raises(ValueError):
+        validator.validate(value, {"sample_rate": 0.1, "sample_mode": "invalid"})
+    with pytest.raises(ValueError):
+        validator.validate(value, {"sample_rate": -1})
+    with pytest.raises(ValueError):
+        validator.validate(value, {"sample_rate": "0.1"})
+    with pytest.raises(ValueError):
+        validator.validate(value, {"sample_rate": 0.1, "sample_edges": -1})
+
+    # strided sampling follows rates that are not 1/n
+    for rate in [0.4, 0.6, 0.7, 0.9]:
+        coverage = {}
+        validator.validate(value, {"sample_rate": rate, "sample_edges": 0}, coverage=coverage)
+        assert(coverage == {"test": [round(rate * 10000), 10000]})
+        indices = list(validator.sample_indices(len(value), {"sample_rate": rate, "sample_edges": 0}))
+        assert(len(set(indices)) == len(indices) and max(indices) < len(value))
+
+    # rates and lengths where float division used to repeat indices or run past the end
+    for length, rate, edges in [(75, 0.68, 0), (182, 0.34, 16)]:
+        check = {"sample_rate": rate, "sample_edges": edges}
+        indices = list(validator.sample_indices(length, check))
+        assert(len(set(indices)) == len(indices) and max(indices) < length)
+        assert(len(indices) == 2 * edges + math.ceil(rate * (length - 2 * edges)))
+        coverage = {}
+        validator.validate(value[:length], check, coverage=coverage)
+        assert(coverage == {"test": [len(indices), length]})
+
+    # nested arrays pass the options on
+    validator = ArrayValidator("outer", ArrayValidator("inner", Int8Validator("item"), {}), {"sample_rate": 0.5})
+    coverage = {}
+    validator.validate([value, value], {}, coverage=coverage)
+    assert(coverage == {"outer": [2, 2], "inner": [2 * (32 + 4984), 20000]})
+    coverage = {}
+    validator.validate([value, value], {}, full_check=True, coverage=coverage)
+    assert(coverage == {"outer": [2, 2], "inner": [20000, 20000]})
+
+
+def test_array_budget():
+    validator = ArrayValidator("test", RegExValidator("test_arrayitem"), {"regex": "^(a+)+$"})
+
+    assert(validator.validate(["a", "aa"], {}, budget=Budget(max_array_len=2, max_string_len=2)) == ["a", "aa"])
+    with pytest.raises(BudgetExceededError, match="more than 2 items"):
+        validator.validate(["a", "a", "a"], {}, budget=Budget(max_array_len=2))
+    # the string is rejected before the regex backtracks
+    with pytest.raises(BudgetExceededError, match="test_arrayitem: string is longer than 10"):
+        validator.validate(["a" * 40 + "!"], {}, budget=Budget(max_string_len=10))
+
+    budget = Budget(timeout=0)
+    time.sleep(0.001)
+    with pytest.raises(BudgetExceededError, match="longer than 0s"):
+        validator.validate(["a"], {}, budget=budget)
+
+    validator = ArrayValidator("outer", ArrayValidator("inner", Int8Validator("item"), {}), {})
+    budget = Budget(max_depth=2)
+    assert(validator.validate([[1], [2]], {}, budget=budget) == [[1], [2]])
+    assert(budget.depth == 0)
+    with pytest.raises(BudgetExceededError, match="inner: nesting is deeper than 1"):
+        validator.validate([[1], [2]], {}, budget=Budget(max_depth=1))
+
+    budget = Budget(max_depth=2)
+    with pytest.raises(ValueError):
+        validator.validate([[1], [1000]], {}, budget=budget)
+    assert(budget.depth == 0)
+
+
+def test_enum_validators():
+    schema = {"_type": "enum", "values": ["eu", "us", 3]}
+
+    validator = EnumValidator("test")
+    assert(validator.validate("eu", schema) == "eu")
+    assert(validator.validate(3, schema) == 3)
+    with pytest.raises(ValueError):
+        validator.validate("asia", schema)
+    with pytest.raises(ValueError):
+        validator.validate([], schema)
+    with pytest.raises(ValueError):
+        validator.validate("eu", {"_type": "enum"})
+
+    validator = EnumValidator("test", values=["a", "b"])
+    assert(validator.validate("a", {}) == "a")
+    with pytest.raises(ValueError):
+        validator.validate("c", {})
+
+
+def test_enum_values_file():
+    with tempfile.TemporaryDirectory() as dir:
+        path = os.path.join(dir, "small.txt")
+        write_sorted_table(path, ["b", "a", "c", "a"])
+        with open(path) as f:
+            assert(f.read() == "a\nb\nc\n")
+
+        validator = EnumValidator("test", values_file=path)
+        assert(isinstance(validator.allowed({}), frozenset))
+        assert(validator.validate("b", {}) == "b")
+        with pytest.raises(ValueError):
+            validator.validate("d", {})
+
+        # changes of the file are picked up by existing validators
+        write_sorted_table(path, ["a", "c", "d"])
+        os.utime(path, ns=(0, 0))
+        assert(validator.validate("d", {}) == "d")
+        with pytest.raises(ValueError):
+            validator.validate("b", {})
+
+        # big enough to be memory-mapped
+        path = os.path.join(dir, "big.txt")
+        skus = [f"SKU-{i:08d}" for i in range(0, 40000, 2)]
+        write_sorted_table(path, skus)
+        schema = {"_type": "enum", "values_file": path}
+        validator = EnumValidator("test")
+        assert(isinstance(validator.allowed(schema), SortedTable))
+        for sku in [skus[0], skus[1], skus[len(skus) // 2], skus[-1]]:
+            assert(validator.validate(sku, schema) == sku)
+        for sku in ["SKU-00000001", "SKU-00039999", "SKU-99999999", "", "A", "Z", "SKU-0000000"]:
+            with pytest.raises(ValueError):
+                validator.validate(sku, schema)
+        with pytest.raises(ValueError):
+            validator.validate(2, schema)
+
+        # arrays look up the values file once, not for every item
+        calls = []
+        load = validators.load_values_file
+        validators.load_values_file = lambda path: calls.append(path) or load(path)
+        try:
+            array = ArrayValidator("test", EnumValidator("test_arrayitem"), schema)
+            assert(array.validate(skus[:100], {}) == skus[:100])
+        finally:
+            validators.load_values_file = load
+        assert(calls == [path])
+
+
+def test_sorted_table():
+    with tempfile.TemporaryDirectory() as dir:
+        path = os.path.join(dir, "table.txt")
+        values = ["x", "xy", "abc", "äöü", "m" * 100, "b"]
+        write_sorted_table(path, values)
+        table = SortedTable(path)
+        for v in values:
+            assert(v in table)
+        for v in ["", "a", "xyz", "abcd", "m", "zz"]:
+            assert(v not in table)
+        table.close()
+
+        write_sorted_table(path, [])
+        table = SortedTable(path)
+        assert("a" not in table)
+        table.close()
+
+        with pytest.raises(ValueError):
+            write_sorted_table(path, ["a\nb"])
+
+
+def test_values_file_formats():
+    with tempfile.TemporaryDirectory() as dir:
+        # small (set) and large (memory-mapped) files follow the same line rules
+        for count in [10, 10000]:
+            path = os.path.join(dir, f"crlf{count}.txt")
+            values = sorted(f"V{i:08d}" for i in range(count))
+            with open(path, "wb") as f:
+                f.write(b"\r\n" + "\r\n".join(values).encode("utf-8") + b"\r\n")
+
+            validator = EnumValidator("test", values_file=path)
+            assert(isinstance(validator.allowed({}), SortedTable if count > 1000 else frozenset))
+            for v in [values[0], values[count // 2], values[-1]]:
+                assert(validator.validate(v, {}) == v)
+            for v in ["", "V", values[-1] + "\r"]:
+                with pytest.raises(ValueError):
+                    validator.validate(v, {})
+
+        path = os.path.join(dir, "unsorted.txt")
+        with open(path, "w") as f:
+            f.write("\n".join(f"V{i:08d}" for i in range(10000, 0, -1)))
+        with pytest.raises(ValueError, match="not sorted"):
+            verify_sorted_table(path)
+        verify_sorted_table(os.path.join(dir, "crlf10000.txt"))
+
+        # sorting the file in place makes it usable
+        subprocess.run([sys.executable, "-m", "generic_schema.sorted_table", path], check=True,
+                       env=dict(os.environ, PYTHONPATH=os.pathsep.join(sys.path)))
+        verify_sorted_table(path)
+        assert(EnumValidator("test", values_file=path).validate("V00000001", {}) == "V00000001")
+        result = subprocess.run([sys.executable, "-m", "generic_schema.sorted_table", "--check", path],
+                                env=dict(os.environ, PYTHONPATH=os.pathsep.join(sys.path)))
+        assert(result.returncode == 0)
+
+
 def test_regex_validators():
     schema = {"_type": "regex", "regex": "^[a-z]+$"}
 
@@ -172,6 +405,8 @@ def test_email_validators():
 
     with pytest.raises(ValueError):
         validator.validate("test", {})
+    with pytest.raises(ValueError):
+        validator.validate(13, {})
 
 
 def test_version_validators():
@@ -191,6 +426,8 @@ def test_file_validator():
         validator.validate(os.path.join(dir, "foobar.txt"), schema)
     with pytest.raises(ValueError):
         validator.validate(dir, schema)
+    with pytest.raises(ValueError):
+        validator.validate(1.5, schema)
 
 
 def test_directory_validator():
@@ -213,6 +450,8 @@ def test_default_key_validator():
     validator = Int8Validator("test")
     assert(validator.validate(None, schema) == 5)
 
+    assert(validator.validate(7, {"_type": "int8", "default": 5}) == 7)
+
     schema = {"_type": "int8", "min": 0, "max": 10}
     with pytest.raises(ValueError):
         validator.validate(None, schema)